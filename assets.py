@@ -6,11 +6,15 @@ import evelink
 import requests
 import dataset
 from datetime import datetime
+from collections import defaultdict
 import time
 import sqlite3
 import os.path
 import sys
 from util import *
+from models import *
+from locations import LocationResolver
+import maintenance
 
 DB_DIR = 'db'
 
@@ -31,6 +35,7 @@ if not os.path.exists(EVE_DB_PATH):
 
 conn = sqlite3.connect(EVE_DB_PATH) # Eve online static db
 db = dataset.connect("sqlite:///%s/evetools.db" % DB_DIR) # evetools cache db
+locations = LocationResolver(conn) # cached location hierarchy
 
 
 def dbquery(sql, uid):
@@ -39,7 +44,7 @@ def dbquery(sql, uid):
     c.execute(sql % uid)
     res = c.fetchone()
     c.close()
-    return res[0]
+    return intern_string(res[0])
 
 
 def activityid_to_string(uid):
@@ -47,7 +52,7 @@ def activityid_to_string(uid):
 
 
 def locationid_to_string(uid):
-    return dbquery("select stationName from staStations where stationID = %d;", uid)
+    return locations.name(uid)
 
 
 def typeid_to_string(uid):
@@ -88,67 +93,91 @@ def buy_price_from_evecentral(typeid):
     return float(median_price)
 
 
-def print_assets(char, api):
-    assets = db['assets']
-
-    asset_data = []
+def asset_rows(char_id, priced_assets, timestamp):
+    """Database rows for the assets table, built one at a time on insert"""
+    for item, price_median in priced_assets:
+        container = item.container
+        yield dict(char_id=char_id,
+                   # parent item
+                   container_id = container.type_id if container else None,
+                   container_name = typeid_to_string(container.type_id) if container else None,
+                   # location of this item (And the parent of course)
+                   location_id = item.location_id,
+                   location_name = locationid_to_string(item.location_id),
+                   # item ID, name, quantity and approximate price
+                   type_id = item.type_id,
+                   name = typeid_to_string(item.type_id),
+                   quantity = item.quantity,
+                   price_median = price_median,
+                   timestamp=timestamp
+                   )
+
+
+def price_assets(char_assets, location_totals):
+    """(item, median buy price) for every item including container contents
+
+    Adds the value of each location to location_totals
+    """
+    priced_assets = []
+    for item in iter_assets(char_assets):
+        price_median = buy_price_from_evecentral(item.type_id)
+        location_totals[item.location_id] += item.quantity * price_median
+        priced_assets.append((item, price_median))
+    return priced_assets
+
+
+def print_assets(priced_assets):
+    """Print assets grouped by location, returns their total value"""
     grand_total = 0
+    location_id = None
+
+    for item, price_median in priced_assets:
+        if item.location_id != location_id:
+            location_id = item.location_id
+            print("Location: ", locationid_to_string(location_id))
+
+        price_total = item.quantity * price_median
+        grand_total += price_total
 
-    for k, v in char.assets().result.iteritems():
-        print("Location: ", locationid_to_string(v['location_id']))
-        for item in v['contents']:
-            quantity = item['quantity']
-            price_median = buy_price_from_evecentral(item['item_type_id'])
-
-            price_total = quantity * price_median
-            grand_total += price_total
-
-            print("   %-53s %5d %10.2f ISK | %.2f ISK" % (typeid_to_string(item['item_type_id']), quantity, price_median, price_total))
-
-            asset_data.append(dict(char_id=char.char_id,
-                               container_id = None,
-                               container_name = None,
-                               location_id = v['location_id'],
-                               location_name = locationid_to_string(v['location_id']),
-                               type_id = item['item_type_id'],
-                               name = typeid_to_string(item['item_type_id']),
-                               quantity = quantity,
-                               price_median = price_median,
-                               timestamp=time.time()
-                               ))
-
-            # insert subitems if the item is a container
-            for subitem in item.get('contents', []):
-                quantity = subitem['quantity']
-                price_median = buy_price_from_evecentral(subitem['item_type_id'])
-
-                price_total = quantity * price_median
-                grand_total += price_total
-
-
-                asset_data.append(dict(char_id=char.char_id,
-                                   # parent item
-                                   container_id = item['item_type_id'],
-                                   container_name = typeid_to_string(item['item_type_id']),
-                                   # location of this item (And the parent of course)
-                                   location_id = v['location_id'],
-                                   location_name = locationid_to_string(v['location_id']),
-                                   # item ID, name, quantity and approximate price
-                                   type_id = subitem['item_type_id'],
-                                   name = typeid_to_string(subitem['item_type_id']),
-                                   quantity = quantity,
-                                   price_median = price_median,
-                                   timestamp=time.time()
-                                   ))
-
-                print("      %-50s %5d %10.2f ISK | %.2f ISK" % (typeid_to_string(subitem['item_type_id']), subitem['quantity'], price_median, price_total))
-
-    assets.insert_many(asset_data)
+        if item.container:
+            print("      %-50s %5d %10.2f ISK | %.2f ISK" % (typeid_to_string(item.type_id), item.quantity, price_median, price_total))
+        else:
+            print("   %-53s %5d %10.2f ISK | %.2f ISK" % (typeid_to_string(item.type_id), item.quantity, price_median, price_total))
 
     return grand_total
 
 
-def main(apikey):
+def location_total_rows(location_totals):
+    for location_id, total in location_totals.items():
+        location = locations.get(location_id)
+        system = location.system
+        region = location.region
+        yield dict(location_id=location_id,
+                   location_name=locationid_to_string(location_id),
+                   system=system.name if system else None,
+                   region=region.name if region else None,
+                   value=total)
+
+
+def print_location_totals(location_totals):
+    """Asset value per region and solar system, most valuable first"""
+    region_totals = defaultdict(float)
+    system_totals = defaultdict(float)
+
+    for location_id, total in location_totals.items():
+        location = locations.get(location_id)
+        region = location.region
+        system = location.system
+        region_totals[region.name if region else "Unknown"] += total
+        system_totals[system.name if system else locationid_to_string(location_id)] += total
+
+    for title, totals in (("Region", region_totals), ("System", system_totals)):
+        print("%-50s %20s" % (title, "Value"))
+        for name, total in sorted(totals.items(), key=lambda item: item[1], reverse=True):
+            print("   %-47s %16.2f ISK" % (name, total))
+
+
+def main(apikey, writer=None):
     from evelink.cache.sqlite import SqliteCache
     evelink_cache = SqliteCache('db/evelink_cache.db')
 
@@ -162,16 +191,41 @@ def main(apikey):
     db['assets'].drop()
 
     try:
-        for char_id in a.characters().result:
-            print("-" * 30)
-            char = evelink.char.Char(char_id, api)
-            grand_total = print_assets(char, api)
-
-            print("*" * 30)
-            print(grand_total, "ISK")
-            print("*" * 30)
+        characters = [evelink.char.Char(char_id, api) for char_id in a.characters().result]
+        char_assets = [(char, assets_from_evelink(char.assets().result)) for char in characters]
     except evelink.api.APIError, e:
-        print("Api Error:", e)
+        # keep machine readable output clean
+        print("Api Error:", e, file=sys.stderr if writer else sys.stdout)
+        return
+
+    # resolve every location of this run in one go
+    all_assets = [item for char, assets in char_assets for item in assets]
+    locations.resolve(set(item.location_id for item in iter_assets(all_assets)), all_assets)
+
+    location_totals = defaultdict(float)
+
+    for char, assets in char_assets:
+        priced_assets = price_assets(assets, location_totals)
+        rows = asset_rows(char.char_id, priced_assets, time.time())
+
+        if writer:
+            db['assets'].insert_many(writer.stream('asset', rows))
+            continue
+
+        db['assets'].insert_many(rows)
+
+        print("-" * 30)
+        grand_total = print_assets(priced_assets)
+
+        print("*" * 30)
+        print(grand_total, "ISK")
+        print("*" * 30)
+
+    if writer:
+        for row in location_total_rows(location_totals):
+            writer.write('location_total', row)
+    else:
+        print_location_totals(location_totals)
 
 
 
@@ -182,7 +236,21 @@ if __name__ == "__main__":
 
         sys.exit(1)
 
+    import argparse
+    import export
+
+    parser = argparse.ArgumentParser(description="List and value assets of all characters")
+    export.add_arguments(parser)
+    args = parser.parse_args()
+    writer = export.get_writer(args.format, output_dir=args.output)
+
     import yaml
     config = yaml.load(file('config.yml'))
 
-    main((config['key'], config['verification']))
+    main((config['key'], config['verification']), writer)
+
+    if writer:
+        writer.close()
+
+    # prune and compact the cache databases if they've grown over budget
+    maintenance.run_if_needed(config.get('maintenance'))
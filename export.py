@@ -0,0 +1,226 @@
+"""Machine readable output for status.py and assets.py
+
+Records are written as they're produced:
+
+    jsonl    one JSON object per line on stdout, with a "kind" field
+    csv      OUTPUT_DIR/<kind>.csv, one file per kind
+    arrow    OUTPUT_DIR/<kind>.arrow Arrow IPC files, needs pyarrow
+    parquet  OUTPUT_DIR/<kind>.parquet, needs pyarrow
+
+The columnar formats write batches of BATCH_SIZE rows. Columns of the file
+formats are fixed by the first row of each kind, later rows with other
+fields raise ValueError. Column types of the columnar formats are fixed by
+the first batch, values that would be truncated to fit raise ValueError.
+"""
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+
+import csv
+import io
+import json
+import os.path
+import sys
+
+FORMATS = ['text', 'jsonl', 'csv', 'arrow', 'parquet']
+
+OUTPUT_DIR = 'export'
+
+# rows per kind buffered by the columnar formats before a batch is written
+BATCH_SIZE = 10000
+
+# batches to buffer at most while waiting for a column's first value
+UNTYPED_BATCHES = 10
+
+
+def as_dict(record):
+    if hasattr(record, 'as_dict'):
+        return record.as_dict()
+    return record
+
+
+class Writer(object):
+    def write(self, kind, record):
+        raise NotImplementedError
+
+    def stream(self, kind, records):
+        """Write records while passing them on, for sharing a generator with the db"""
+        for record in records:
+            self.write(kind, record)
+            yield record
+
+    def close(self):
+        pass
+
+
+class JsonLinesWriter(Writer):
+    def __init__(self, stream):
+        self.out = stream
+
+    def write(self, kind, record):
+        row = dict(as_dict(record))
+        row['kind'] = kind
+        self.out.write(json.dumps(row))
+        self.out.write("\n")
+
+    def close(self):
+        self.out.flush()
+
+
+def check_fields(kind, fields, row):
+    """Streamed formats fix their columns from the first row of each kind"""
+    unexpected = set(row) - set(fields)
+    if unexpected:
+        raise ValueError("%s record has fields not in its first row: %s" % (kind, ", ".join(sorted(unexpected))))
+
+
+class CsvWriter(Writer):
+    def __init__(self, output_dir=OUTPUT_DIR):
+        self.output_dir = output_dir
+        self.files = {}   # kind -> open file
+        self.csvs = {}    # kind -> csv writer
+        self.fields = {}  # kind -> column order
+
+    def _encode(self, values):
+        # python 2 csv module only handles byte strings
+        if sys.version_info[0] == 2:
+            return [v.encode('utf-8') if isinstance(v, unicode) else v for v in values]
+        return values
+
+    def _open(self, kind):
+        if not os.path.exists(self.output_dir):
+            os.mkdir(self.output_dir)
+        path = os.path.join(self.output_dir, "%s.csv" % kind)
+        if sys.version_info[0] == 2:
+            f = open(path, 'wb')
+        else:
+            f = io.open(path, 'w', newline='')
+        self.files[kind] = f
+        self.csvs[kind] = csv.writer(f)
+        return self.csvs[kind]
+
+    def write(self, kind, record):
+        row = as_dict(record)
+        fields = self.fields.get(kind)
+        if fields is None:
+            fields = self.fields[kind] = sorted(row.keys())
+            self._open(kind).writerow(self._encode(fields))
+        else:
+            check_fields(kind, fields, row)
+        self.csvs[kind].writerow(self._encode([row.get(field) for field in fields]))
+
+    def close(self):
+        for kind, f in self.files.items():
+            f.close()
+            print("Wrote %s" % os.path.join(self.output_dir, "%s.csv" % kind), file=sys.stderr)
+
+
+class ColumnarWriter(Writer):
+    def __init__(self, fmt, output_dir=OUTPUT_DIR, batch_size=BATCH_SIZE):
+        try:
+            import pyarrow
+        except ImportError:
+            print("%s export needs pyarrow, install it with: pip install pyarrow" % fmt, file=sys.stderr)
+            sys.exit(1)
+
+        self.fmt = fmt
+        self.output_dir = output_dir
+        self.batch_size = batch_size
+        self.fields = {}   # kind -> column order
+        self.columns = {}  # kind -> {field: [values]} of the current batch
+        self.writers = {}  # kind -> open file writer
+        self.schemas = {}  # kind -> schema of the first batch
+        self.string_fields = {}  # kind -> fields without a type in the first batch
+        self.rows = {}     # kind -> rows written
+
+    def write(self, kind, record):
+        row = as_dict(record)
+        fields = self.fields.get(kind)
+        if fields is None:
+            fields = self.fields[kind] = sorted(row.keys())
+            self.columns[kind] = dict((field, []) for field in fields)
+            self.rows[kind] = 0
+        else:
+            check_fields(kind, fields, row)
+
+        columns = self.columns[kind]
+        for field in fields:
+            columns[field].append(row.get(field))
+
+        if len(columns[fields[0]]) >= self.batch_size:
+            self._flush(kind)
+
+    def _flush(self, kind, final=False):
+        import pyarrow
+
+        columns = self.columns[kind]
+        count = len(columns[self.fields[kind][0]])
+        if not count:
+            return
+
+        writer = self.writers.get(kind)
+        if writer is None:
+            # the first batch fixes the schema, keep buffering while a column
+            # has no values to infer its type from
+            table = pyarrow.Table.from_pydict(columns)
+            untyped = [field.name for field in table.schema if pyarrow.types.is_null(field.type)]
+            if untyped and not final and count < self.batch_size * UNTYPED_BATCHES:
+                return
+            # give up on those and store them as strings
+            self.string_fields[kind] = untyped
+            schema = pyarrow.schema([pyarrow.field(field.name, pyarrow.string()) if field.name in untyped else field
+                                     for field in table.schema])
+        else:
+            # later batches are cast to the schema of the first one
+            schema = self.schemas[kind]
+
+        for field in self.string_fields[kind]:
+            columns[field] = ["%s" % value if value is not None else None for value in columns[field]]
+        try:
+            # a safe cast refuses to truncate, e.g. floats into an int column
+            table = pyarrow.Table.from_pydict(columns).cast(schema, safe=True)
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowNotImplementedError) as e:
+            raise ValueError("%s records don't fit the types of their first batch: %s" % (kind, e))
+
+        if writer is None:
+            if not os.path.exists(self.output_dir):
+                os.mkdir(self.output_dir)
+            path = os.path.join(self.output_dir, "%s.%s" % (kind, self.fmt))
+            if self.fmt == 'parquet':
+                import pyarrow.parquet
+                writer = pyarrow.parquet.ParquetWriter(path, table.schema)
+            else:
+                import pyarrow.ipc
+                writer = pyarrow.ipc.new_file(path, table.schema)
+            self.writers[kind] = writer
+            self.schemas[kind] = table.schema
+
+        writer.write_table(table)
+        self.rows[kind] += count
+        for column in columns.values():
+            del column[:]
+
+    def close(self):
+        for kind in self.columns:
+            self._flush(kind, final=True)
+        for kind, writer in self.writers.items():
+            writer.close()
+            print("Wrote %d rows to %s" % (self.rows[kind], os.path.join(self.output_dir, "%s.%s" % (kind, self.fmt))),
+                  file=sys.stderr)
+
+
+def get_writer(fmt, stream=sys.stdout, output_dir=OUTPUT_DIR):
+    """Writer for fmt, None for the human readable text output"""
+    if fmt == 'jsonl':
+        return JsonLinesWriter(stream)
+    if fmt == 'csv':
+        return CsvWriter(output_dir)
+    if fmt in ('arrow', 'parquet'):
+        return ColumnarWriter(fmt, output_dir)
+    return None
+
+
+def add_arguments(parser):
+    parser.add_argument('--format', choices=FORMATS, default='text',
+                        help="output format, default is human readable text")
+    parser.add_argument('--output', default=OUTPUT_DIR,
+                        help="directory for csv, arrow and parquet files (default: %(default)s)")
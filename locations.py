@@ -0,0 +1,189 @@
+"""Resolve location IDs to stations, solar systems, regions and containers
+
+Asset and job location IDs can point to stations, solar systems, office
+folders, player structures or to items (containers, ships) in the
+character's own asset tree. LocationResolver resolves a whole batch of IDs
+with a handful of set-based queries against the static db and caches the
+resulting item -> station -> system -> region hierarchy.
+"""
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+
+from models import Location, intern_string, iter_assets
+
+# stay well below sqlite's default limit of 999 query parameters
+CHUNK_SIZE = 500
+
+
+def location_kind(uid):
+    """Guess what a location ID points to from the ranges CCP uses"""
+    if 10000000 <= uid < 11000000:
+        return 'region'
+    if 30000000 <= uid < 32000000:
+        return 'system'
+    if 60000000 <= uid < 64000000:
+        return 'station'
+    if 66000000 <= uid < 68000000:
+        return 'office'
+    if uid >= 1000000000000:
+        return 'structure'
+    return 'unknown'
+
+
+def office_station_id(uid):
+    """Office folders are offset from the station they're in
+
+    Offices from 66014934 up are in conquerable outposts. Outposts aren't
+    in staStations or mapDenormalize, so they resolve to a Station(<id>)
+    placeholder.
+    """
+    if uid < 66014934:
+        return uid - 6000001
+    return uid - 6000000
+
+
+class LocationResolver(object):
+    def __init__(self, conn):
+        self.conn = conn  # static db
+        self.locations = {}
+        self.items = {}  # item ID -> Asset, for containers and ships
+
+    def _query(self, sql, uids):
+        """Run sql with an IN list, in chunks"""
+        uids = list(uids)
+        rows = []
+        c = self.conn.cursor()
+        for i in range(0, len(uids), CHUNK_SIZE):
+            chunk = uids[i:i + CHUNK_SIZE]
+            c.execute(sql % ",".join("?" * len(chunk)), chunk)
+            rows.extend(c.fetchall())
+        c.close()
+        return rows
+
+    def resolve(self, location_ids, assets=()):
+        """Resolve all location_ids in one go
+
+        assets is the character's asset tree, items in it can be the
+        location of other items
+        """
+        for item in iter_assets(assets):
+            self.items[item.id] = item
+
+        pending = set(location_ids) - set(self.locations)
+        if not pending:
+            return
+
+        # walk up through containers and office folders until we hit
+        # something the static db knows about
+        parents = {}
+        lookup = set()
+        todo = set(pending)
+        while todo:
+            uid = todo.pop()
+            if uid in self.items:
+                item = self.items[uid]
+                parent_id = item.container.id if item.container else item.location_id
+            elif location_kind(uid) == 'office':
+                parent_id = office_station_id(uid)
+            else:
+                lookup.add(uid)
+                continue
+            parents[uid] = parent_id
+            if parent_id not in parents and parent_id not in self.locations and parent_id not in lookup:
+                todo.add(parent_id)
+
+        lookup -= set(self.locations)
+        stations = {}  # station ID -> (name, system ID)
+        systems = {}   # system ID -> (name, region ID)
+        regions = {}   # region ID -> name
+
+        station_ids = set(uid for uid in lookup if location_kind(uid) == 'station')
+        for uid, name, system_id in self._query("select stationID, stationName, solarSystemID "
+                                                "from staStations where stationID in (%s);", station_ids):
+            stations[uid] = (name, system_id)
+
+        # anything else in the universe, planets, moons and the like
+        others = {}  # item ID -> (name, system ID, region ID)
+        other_ids = set(uid for uid in lookup if location_kind(uid) in ('unknown', 'structure') or
+                        (location_kind(uid) == 'station' and uid not in stations))
+        for uid, name, system_id, region_id in self._query("select itemID, itemName, solarSystemID, regionID "
+                                                           "from mapDenormalize where itemID in (%s);", other_ids):
+            others[uid] = (name, system_id, region_id)
+
+        system_ids = set(uid for uid in lookup if location_kind(uid) == 'system')
+        system_ids.update(system_id for name, system_id in stations.values())
+        system_ids.update(other[1] for other in others.values() if other[1])
+        system_ids -= set(self.locations)
+        for uid, name, region_id in self._query("select solarSystemID, solarSystemName, regionID "
+                                                "from mapSolarSystems where solarSystemID in (%s);", system_ids):
+            systems[uid] = (name, region_id)
+
+        region_ids = set(uid for uid in lookup if location_kind(uid) == 'region')
+        region_ids.update(region_id for name, region_id in systems.values())
+        region_ids.update(other[2] for other in others.values() if other[2] and not other[1])
+        region_ids -= set(self.locations)
+        for uid, name in self._query("select regionID, regionName from mapRegions where regionID in (%s);", region_ids):
+            regions[uid] = name
+
+        # build the hierarchy top down so parents always exist
+        for uid, name in regions.items():
+            self._add(uid, name, 'region', None)
+        for uid, (name, region_id) in systems.items():
+            self._add(uid, name, 'system', self.locations.get(region_id))
+        for uid, (name, system_id) in stations.items():
+            self._add(uid, name, 'station', self.locations.get(system_id))
+        for uid, (name, system_id, region_id) in others.items():
+            if uid in self.locations: continue
+            parent = self.locations.get(system_id) or self.locations.get(region_id)
+            kind = location_kind(uid)
+            self._add(uid, name, 'celestial' if kind == 'unknown' else kind, parent)
+        for uid in lookup:
+            if uid not in self.locations:
+                kind = location_kind(uid)
+                self._add(uid, "%s(%d)" % (kind.capitalize(), uid), kind, None)
+
+        # containers and offices last, their parents may be containers too
+        for uid in parents:
+            self._add_child(uid, parents)
+
+    def _add(self, uid, name, kind, parent):
+        self.locations[uid] = Location(id=uid, name=intern_string(name), kind=kind, parent=parent)
+
+    def _add_child(self, uid, parents):
+        if uid in self.locations:
+            return self.locations[uid]
+        parent_id = parents[uid]
+        if parent_id in parents:
+            parent = self._add_child(parent_id, parents)
+        else:
+            parent = self.locations.get(parent_id)
+
+        if uid in self.items:
+            kind = 'container'
+            name = self.type_name(self.items[uid].type_id)
+        else:
+            kind = 'office'
+            name = "Office"
+        self._add(uid, name, kind, parent)
+        return self.locations[uid]
+
+    def type_name(self, type_id):
+        c = self.conn.cursor()
+        c.execute("select typeName from invTypes where typeID = ?;", (type_id,))
+        res = c.fetchone()
+        c.close()
+        if res:
+            return res[0]
+        return "Unknown(%d)" % type_id
+
+    def get(self, uid):
+        if uid not in self.locations:
+            self.resolve([uid])
+        return self.locations[uid]
+
+    def name(self, uid):
+        """Human readable name, containers include where they are"""
+        location = self.get(uid)
+        if location.kind in ('container', 'office') and location.parent:
+            return "%s in %s" % (location.name, self.name(location.parent.id))
+        return location.name
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+"""Prune, compact and analyze the local cache databases.
+
+Run directly to force a full maintenance pass, or call run_if_needed() at the
+end of a normal run to only do the work once a budget has been exceeded.
+
+Budgets can be overridden with a `maintenance` section in config.yml:
+
+    maintenance:
+      price_max_age: 86400       # seconds, buy_prices rows older than this are dropped
+      evetools_max_mb: 50        # size budget for db/evetools.db
+      evelink_max_mb: 50         # size budget for db/evelink_cache.db
+"""
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+
+import sqlite3
+import time
+import os.path
+import sys
+
+DB_DIR = 'db'
+
+EVETOOLS_DB_PATH = os.path.join(DB_DIR, 'evetools.db')
+EVELINK_DB_PATH = os.path.join(DB_DIR, 'evelink_cache.db')
+
+DEFAULTS = {
+    'price_max_age': 24 * 3600,
+    'evetools_max_mb': 50,
+    'evelink_max_mb': 50,
+}
+
+# tables in the evetools cache db that can be evicted oldest-first. The
+# assets table is a snapshot rewritten on every assets.py run, not a cache,
+# vacuuming reclaims the space its drop freed
+EVETOOLS_TABLES = ['buy_prices']
+
+# give up shrinking after this many eviction rounds
+MAX_ROUNDS = 5
+
+
+def load_settings(config=None):
+    settings = dict(DEFAULTS)
+    if config:
+        settings.update(config)
+    return settings
+
+
+def file_size_mb(path):
+    if not os.path.exists(path):
+        return 0
+    return os.path.getsize(path) / (1024 * 1024)
+
+
+def existing_tables(conn):
+    c = conn.execute("select name from sqlite_master where type = 'table';")
+    tables = set(row[0] for row in c.fetchall())
+    c.close()
+    return tables
+
+
+def compact(conn):
+    """Reclaim free pages and refresh query planner statistics"""
+    conn.execute("VACUUM;")
+    conn.execute("ANALYZE;")
+
+
+def evict_oldest(conn, table, column, fraction):
+    """Delete the oldest `fraction` of rows in table, ordered by column"""
+    count = conn.execute("select count(*) from %s;" % table).fetchone()[0]
+    limit = int(count * fraction) + 1
+    c = conn.execute("delete from %s where rowid in "
+                     "(select rowid from %s order by %s asc limit %d);" % (table, table, column, limit))
+    return c.rowcount
+
+
+def table_sizes_mb(conn):
+    """Space used by each table including its indexes, freed pages don't count"""
+    c = conn.execute("select m.tbl_name, sum(s.pgsize) from dbstat s "
+                     "join sqlite_master m on s.name = m.name group by m.tbl_name;")
+    sizes = dict((name, size / (1024 * 1024)) for name, size in c.fetchall())
+    c.close()
+    return sizes
+
+
+def shrink_to_budget(conn, path, max_mb, targets):
+    """Evict least recently written rows until the file fits in max_mb
+
+    targets is a list of (table, ordering column) tuples. Only those count
+    against the budget, if the other tables alone are over it nothing is
+    evicted.
+    """
+    evictable = set(table for table, column in targets)
+    removed = 0
+    for _ in range(MAX_ROUNDS):
+        sizes = table_sizes_mb(conn)
+        evictable_mb = sum(size for table, size in sizes.items() if table in evictable)
+        fixed_mb = sum(size for table, size in sizes.items() if table not in evictable)
+
+        if fixed_mb >= max_mb:
+            print("Warning: %s needs %.1f MB for data that isn't a cache, over its %.1f MB budget" %
+                  (path, fixed_mb, max_mb), file=sys.stderr)
+            break
+
+        budget = max_mb - fixed_mb
+        if evictable_mb <= budget:
+            break
+        fraction = 1 - budget / evictable_mb
+
+        evicted = 0
+        for table, column in targets:
+            evicted += evict_oldest(conn, table, column, fraction)
+        conn.commit()
+        if not evicted:
+            break
+        removed += evicted
+    return removed
+
+
+def compact_if_needed(conn, removed):
+    """Only rewrite a file that had rows removed or has freed pages to reclaim"""
+    free_pages = conn.execute("pragma freelist_count;").fetchone()[0]
+    if removed or free_pages:
+        compact(conn)
+
+
+def maintain_evetools(settings, now):
+    path = EVETOOLS_DB_PATH
+    if not os.path.exists(path):
+        return 0
+
+    conn = sqlite3.connect(path)
+    tables = existing_tables(conn)
+    removed = 0
+
+    # TTL: price rows are only trusted for an hour, anything older than
+    # price_max_age is never going to be used again
+    if 'buy_prices' in tables:
+        c = conn.execute("delete from buy_prices where timestamp < ?;", (now - settings['price_max_age'],))
+        removed += c.rowcount
+    conn.commit()
+
+    targets = [(table, 'timestamp') for table in EVETOOLS_TABLES if table in tables]
+    removed += shrink_to_budget(conn, path, settings['evetools_max_mb'], targets)
+    compact_if_needed(conn, removed)
+    conn.close()
+    return removed
+
+
+def maintain_evelink(settings, now):
+    path = EVELINK_DB_PATH
+    if not os.path.exists(path):
+        return 0
+
+    conn = sqlite3.connect(path)
+    if 'cache' not in existing_tables(conn):
+        conn.close()
+        return 0
+
+    # TTL: evelink only removes expired entries when they're read again
+    c = conn.execute("delete from cache where expiration < ?;", (now,))
+    removed = c.rowcount
+    conn.commit()
+
+    # evelink doesn't track access times, entries expiring soonest go first
+    removed += shrink_to_budget(conn, path, settings['evelink_max_mb'], [('cache', 'expiration')])
+    compact_if_needed(conn, removed)
+    conn.close()
+    return removed
+
+
+def over_budget(settings):
+    return (file_size_mb(EVETOOLS_DB_PATH) > settings['evetools_max_mb'] or
+            file_size_mb(EVELINK_DB_PATH) > settings['evelink_max_mb'])
+
+
+def run(config=None):
+    """Run a full maintenance pass, returns number of rows removed"""
+    settings = load_settings(config)
+    now = time.time()
+
+    removed = maintain_evetools(settings, now)
+    removed += maintain_evelink(settings, now)
+    return removed
+
+
+def run_if_needed(config=None):
+    """Run maintenance only if one of the cache files is over its budget"""
+    settings = load_settings(config)
+    if not over_budget(settings):
+        return 0
+    return run(config)
+
+
+def main(config=None):
+    print("Before: evetools.db %.1f MB, evelink_cache.db %.1f MB" % (file_size_mb(EVETOOLS_DB_PATH),
+                                                                     file_size_mb(EVELINK_DB_PATH)))
+    removed = run(config)
+    print("Removed %d rows" % removed)
+    print("After: evetools.db %.1f MB, evelink_cache.db %.1f MB" % (file_size_mb(EVETOOLS_DB_PATH),
+                                                                    file_size_mb(EVELINK_DB_PATH)))
+
+
+if __name__ == "__main__":
+    config = None
+    if os.path.exists('config.yml'):
+        import yaml
+        config = yaml.load(open('config.yml')).get('maintenance')
+
+    main(config)
@@ -0,0 +1,190 @@
+"""Compact record types shared by status.py, assets.py and ui.py
+
+All records use __slots__ so holding dozens of characters with large asset
+lists in memory doesn't cost a dict per object. Records keep references to
+the values evelink returned instead of copying them.
+"""
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+
+_strings = {}
+
+
+def intern_string(s):
+    """Return a shared copy of s, works for both str and unicode"""
+    if s is None:
+        return None
+    return _strings.setdefault(s, s)
+
+
+class Record(object):
+    __slots__ = ()
+
+    def __init__(self, **kwargs):
+        for field in self.__slots__:
+            setattr(self, field, kwargs.get(field))
+
+    def as_dict(self):
+        return dict((field, getattr(self, field)) for field in self.__slots__)
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__,
+                           ", ".join("%s=%r" % (field, getattr(self, field)) for field in self.__slots__))
+
+
+class Character(Record):
+    __slots__ = ('cid', 'name', 'corporation', 'age', 'location', 'balance',
+                 'skillpoints', 'clone_skillpoints', 'attributes', 'skills',
+                 'skill_queue', 'active_jobs', 'active_orders')
+
+    @classmethod
+    def from_evelink(cls, char_id, character_sheet, character_info):
+        return cls(cid=char_id,
+                   name=intern_string(character_sheet['name']),
+                   corporation=intern_string(character_sheet['corp']['name']),
+                   age=character_sheet['create_ts'],
+                   location=intern_string(character_info['location']),
+                   balance=int(character_sheet['balance']),
+                   skillpoints=character_sheet['skillpoints'],
+                   clone_skillpoints=character_sheet['clone']['skillpoints'],
+                   attributes=attributes_from_evelink(character_sheet),
+                   skills=skills_from_evelink(character_sheet),
+                   skill_queue=[],
+                   active_jobs=[],
+                   active_orders=[])
+
+
+class Order(Record):
+    __slots__ = ('id', 'type_id', 'location_id', 'price', 'amount', 'amount_left',
+                 'status', 'type', 'timestamp', 'duration')
+
+    @classmethod
+    def from_evelink(cls, order_id, order):
+        return cls(id=order_id,
+                   type_id=order['type_id'],
+                   location_id=order['location_id'],
+                   price=order['price'],
+                   amount=order['amount'],
+                   amount_left=order['amount_left'],
+                   status=intern_string(order['status']),
+                   type=intern_string(order['type']),
+                   timestamp=order['timestamp'],
+                   duration=order['duration'])
+
+    @property
+    def expires_ts(self):
+        return self.timestamp + self.duration * 24 * 3600
+
+    @property
+    def total(self):
+        return self.price * self.amount_left
+
+
+class IndustryJob(Record):
+    __slots__ = ('id', 'activity_id', 'type_id', 'container_id', 'status', 'delivered', 'end_ts')
+
+    @classmethod
+    def from_evelink(cls, job_id, job):
+        return cls(id=job_id,
+                   activity_id=job['activity_id'],
+                   type_id=job['output']['type_id'],
+                   container_id=job['container_id'],
+                   status=intern_string(job['status']),
+                   delivered=job['delivered'],
+                   end_ts=job['end_ts'])
+
+
+class SkillQueueEntry(Record):
+    __slots__ = ('position', 'type_id', 'level', 'start_sp', 'end_sp', 'start_ts', 'end_ts')
+
+    @classmethod
+    def from_evelink(cls, skill):
+        return cls(position=skill['position'],
+                   type_id=skill['type_id'],
+                   level=skill['level'],
+                   start_sp=skill['start_sp'],
+                   end_sp=skill['end_sp'],
+                   start_ts=skill['start_ts'],
+                   end_ts=skill['end_ts'])
+
+
+class Asset(Record):
+    __slots__ = ('id', 'type_id', 'location_id', 'quantity', 'flag', 'packaged', 'container', 'contents')
+
+    @classmethod
+    def from_evelink(cls, item, location_id, container=None):
+        asset = cls(id=item['id'],
+                    type_id=item['item_type_id'],
+                    location_id=item.get('location_id', location_id),
+                    quantity=item['quantity'],
+                    flag=item.get('location_flag'),
+                    packaged=item.get('packaged'),
+                    container=container)
+        asset.contents = tuple(cls.from_evelink(subitem, asset.location_id, asset) for subitem in item.get('contents', ()))
+        return asset
+
+
+class Location(Record):
+    """A node in the item -> station -> system -> region hierarchy"""
+    __slots__ = ('id', 'name', 'kind', 'parent')
+
+    def find(self, kind):
+        """Closest location of the given kind, starting from this one"""
+        location = self
+        while location is not None and location.kind != kind:
+            location = location.parent
+        return location
+
+    @property
+    def station(self):
+        return self.find('station')
+
+    @property
+    def system(self):
+        return self.find('system')
+
+    @property
+    def region(self):
+        return self.find('region')
+
+
+def attributes_from_evelink(character_sheet):
+    """Attribute name -> value including implants"""
+    attributes = {}
+    for name, value in character_sheet['attributes'].items():
+        attributes[name] = value.get('total', value['base'])
+    return attributes
+
+
+def skills_from_evelink(character_sheet):
+    """Skill type ID -> trained skill points"""
+    return dict((skill['id'], skill['skillpoints']) for skill in character_sheet['skills'])
+
+
+def skill_queue_from_evelink(result):
+    return [SkillQueueEntry.from_evelink(skill) for skill in result]
+
+
+def orders_from_evelink(result):
+    return [Order.from_evelink(oid, order) for oid, order in result.items()]
+
+
+def industry_jobs_from_evelink(result):
+    return [IndustryJob.from_evelink(job_id, job) for job_id, job in result.items()]
+
+
+def assets_from_evelink(result):
+    """Top level assets, containers hold their items in .contents"""
+    assets = []
+    for location_id, location in result.items():
+        for item in location['contents']:
+            assets.append(Asset.from_evelink(item, location_id))
+    return assets
+
+
+def iter_assets(assets):
+    """Walk all assets depth first, including items inside containers"""
+    for asset in assets:
+        yield asset
+        for subitem in iter_assets(asset.contents):
+            yield subitem
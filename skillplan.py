@@ -0,0 +1,164 @@
+"""Offline skill training projections from static db attributes
+
+Training speed only depends on the skill's rank, its primary and secondary
+attributes and the character's attributes, all of which are known locally.
+SkillPlanner uses them to project queue end times and to time what-if plans
+without calling the API.
+"""
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+
+# dgmTypeAttributes attribute IDs
+ATTR_PRIMARY = 180
+ATTR_SECONDARY = 181
+ATTR_RANK = 275  # skillTimeConstant
+
+ATTRIBUTE_NAMES = {
+    164: 'charisma',
+    165: 'intelligence',
+    166: 'memory',
+    167: 'perception',
+    168: 'willpower',
+}
+
+# skill points needed for each level of a rank 1 skill
+LEVEL_SP = [0, 250, 1415, 8000, 45255, 256000]
+
+# a skill queue with less than this much training left has room for more
+FREE_ROOM_SECONDS = 24 * 3600
+
+
+class SkillData(object):
+    """Rank and training attributes of every skill, read once from the static db"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._skills = None
+
+    @property
+    def skills(self):
+        if self._skills is None:
+            self._skills = self._load()
+        return self._skills
+
+    def _load(self):
+        c = self.conn.cursor()
+        c.execute("select typeID, attributeID, coalesce(valueInt, valueFloat) from dgmTypeAttributes "
+                  "where attributeID in (?, ?, ?);", (ATTR_PRIMARY, ATTR_SECONDARY, ATTR_RANK))
+        attributes = {}
+        for type_id, attribute_id, value in c.fetchall():
+            attributes.setdefault(type_id, {})[attribute_id] = value
+        c.close()
+
+        # type ID -> (rank, primary attribute, secondary attribute)
+        skills = {}
+        for type_id, values in attributes.items():
+            if len(values) < 3: continue
+            skills[type_id] = (int(values[ATTR_RANK]),
+                               ATTRIBUTE_NAMES.get(int(values[ATTR_PRIMARY])),
+                               ATTRIBUTE_NAMES.get(int(values[ATTR_SECONDARY])))
+        return skills
+
+
+class SkillPlanner(object):
+    def __init__(self, skill_data, attributes, skillpoints=None):
+        self.skills = skill_data.skills
+        self.attributes = attributes
+        self.skillpoints = skillpoints or {}
+        self._rates = {}
+
+    def sp_per_second(self, type_id):
+        """Training speed, None if the skill or the character's attributes are unknown"""
+        if type_id in self._rates:
+            return self._rates[type_id]
+        rate = None
+        if type_id in self.skills:
+            rank, primary, secondary = self.skills[type_id]
+            rate = (self.attributes.get(primary, 0) + self.attributes.get(secondary, 0) / 2) / 60
+        self._rates[type_id] = rate or None
+        return self._rates[type_id]
+
+    def level_sp(self, type_id, level):
+        return LEVEL_SP[level] * self.skills[type_id][0]
+
+    def training_time(self, type_id, level, start_sp=None):
+        """Seconds needed to train type_id to level, None if it can't be timed"""
+        rate = self.sp_per_second(type_id)
+        if rate is None:
+            return None
+        if start_sp is None:
+            start_sp = self.skillpoints.get(type_id, 0)
+        needed = self.level_sp(type_id, level) - start_sp
+        if needed <= 0:
+            return 0
+        return needed / rate
+
+    def plan_time(self, plan):
+        """Seconds needed to train a plan, a sequence of (type ID, level) tuples
+
+        Skills trained earlier in the plan count towards later levels, the
+        character's own skill points are not modified. None if a skill in
+        the plan can't be timed.
+        """
+        trained = {}
+        skillpoints = self.skillpoints
+        skills = self.skills
+        rates = self._rates
+        total = 0
+        for type_id, level in plan:
+            sp = trained.get(type_id)
+            if sp is None:
+                sp = skillpoints.get(type_id, 0)
+            rate = rates.get(type_id) or self.sp_per_second(type_id)
+            if rate is None:
+                return None
+            target = LEVEL_SP[level] * skills[type_id][0]
+            if target <= sp: continue
+            total += (target - sp) / rate
+            trained[type_id] = target
+        return total
+
+    def project_queue(self, skill_queue, now):
+        """Projected (entry, start, end) timestamps for a skill queue
+
+        Finished entries are dropped. Times reported by the API are kept,
+        entries without them (a paused queue) are projected from now. Once
+        an entry can't be timed its end and everything after it is None.
+        Timestamps are whole seconds, like the ones the API reports.
+        """
+        projection = []
+        now = int(now)
+        start = now
+        trained = {}
+        for entry in skill_queue:
+            if entry.end_ts:
+                if entry.end_ts < now: continue
+                begin, end = int(max(entry.start_ts, now)), int(entry.end_ts)
+            else:
+                sp = trained.get(entry.type_id, self.skillpoints.get(entry.type_id, entry.start_sp))
+                rate = self.sp_per_second(entry.type_id)
+                begin = start
+                if start is None or rate is None:
+                    end = None
+                else:
+                    end = start + int(max(entry.end_sp - max(sp, entry.start_sp), 0) / rate)
+            trained[entry.type_id] = entry.end_sp
+            projection.append((entry, begin, end))
+            start = end
+        return projection
+
+
+def is_paused(skill_queue):
+    return bool(skill_queue) and not skill_queue[0].end_ts
+
+
+def queue_end(projection, now):
+    """When the queue runs out, None if that's unknown"""
+    if not projection:
+        return now
+    return projection[-1][2]
+
+
+def has_free_room(projection, now):
+    end = queue_end(projection, now)
+    return end is not None and end - now < FREE_ROOM_SECONDS
@@ -5,6 +5,7 @@ from __future__ import unicode_literals, division, absolute_import, print_functi
 from datetime import datetime
 from dateutil.relativedelta import *
 import sqlite3
+import time
 import os.path
 import sys
 
@@ -12,6 +13,10 @@ import evelink
 import dataset
 
 from util import *
+from models import *
+from locations import LocationResolver
+from skillplan import *
+import maintenance
 
 DB_DIR = 'db'
 
@@ -33,6 +38,8 @@ if not os.path.exists(EVE_DB_PATH):
 
 conn = sqlite3.connect(EVE_DB_PATH) # Eve online static db
 db = dataset.connect("sqlite:///%s/evetools.db" % DB_DIR) # evetools cache db
+locations = LocationResolver(conn) # cached location hierarchy
+skill_data = SkillData(conn) # skill ranks and attributes
 
 
 def dbquery(sql, uid):
@@ -42,7 +49,7 @@ def dbquery(sql, uid):
     res = c.fetchone()
     c.close()
     if res:
-        return res[0]
+        return intern_string(res[0])
     else:
         return "Unknown(%d)" % uid
 
@@ -52,7 +59,7 @@ def activityid_to_string(uid):
 
 
 def locationid_to_string(uid):
-    return dbquery("select stationName from staStations where stationID = %d;", uid)
+    return locations.name(uid)
 
 
 def typeid_to_string(uid):
@@ -64,44 +71,51 @@ def print_contracts(char, api):
         print (k, v)
 
 
+def active_industry_jobs(char):
+    #return [job for job in industry_jobs_from_evelink(char.industry_jobs().result) if job.delivered == False and job.status != "failed"]
+    return []
+
+
 def print_industry_jobs(char, api):
     """List active industry jobs"""
-    #active_jobs = [v for v in char.industry_jobs().result.values() if v['delivered'] == False and v['status'] != "failed"]
-
-    active_jobs = None
+    active_jobs = active_industry_jobs(char)
     if not active_jobs: return
 
     print("Industry Jobs:")
 
     for job in active_jobs:
-        print("   %s" % locationid_to_string(job['container_id']))
-        print("      %s | %s | %s" % (activityid_to_string(job['activity_id']),
-                                   typeid_to_string(job['output']['type_id']),
-                                   timestamp_to_string(job['end_ts'])))
+        print("   %s" % locationid_to_string(job.container_id))
+        print("      %s | %s | %s" % (activityid_to_string(job.activity_id),
+                                   typeid_to_string(job.type_id),
+                                   timestamp_to_string(job.end_ts)))
+
+
+def active_market_orders(char):
+    active_orders = [order for order in orders_from_evelink(char.orders().result) if order.status == 'active']
+
+    # sort by timestamp, first ones to expire on top
+    return sorted(active_orders, key=lambda item: item.timestamp, reverse=False)
 
 
 def print_orders(char, api):
     """List active orders"""
 
-    active_orders = [order for oid, order in char.orders().result.iteritems() if order['status'] == 'active']
+    active_orders = active_market_orders(char)
     if not active_orders: return
 
-    # sort by timestamp, first ones to expire on top
-    active_orders = sorted(active_orders, key=lambda item: item['timestamp'], reverse=False)
-
     print("Orders (%d):" % len(active_orders))
 
     total_isk = 0
 
     for order in active_orders:
-        total_isk += order['price'] * order['amount_left']
+        total_isk += order.total
 
-        td = relativedelta((datetime.fromtimestamp(order['timestamp']) + relativedelta(days=order['duration'])), datetime.now())
+        td = relativedelta(datetime.fromtimestamp(order.expires_ts), datetime.now())
         tdstr = "%dd %dh %dm" % (td.days, td.hours, td.minutes)
 
-        msg = (u"  %-50s  %17s %4d units end: %s" % (typeid_to_string(order['type_id']),
-                                                     format_currency(order['price']),
-                                                     order['amount_left'],
+        msg = (u"  %-50s  %17s %4d units end: %s" % (typeid_to_string(order.type_id),
+                                                     format_currency(order.price),
+                                                     order.amount_left,
                                                      tdstr))
         print(msg.encode('utf-8'))
 
@@ -109,18 +123,38 @@ def print_orders(char, api):
 
 
 def print_assets(char, api):
-    for k, v in char.assets().result.iteritems():
-        print("Location: ", locationid_to_string(v['location_id']))
-        for item in v['contents']:
-            print("   %-53s %d" % (typeid_to_string(item['item_type_id']), item['quantity']))
-            for subitem in item.get('contents', []):
-                print("      %-50s %d" % (typeid_to_string(subitem['item_type_id']), subitem['quantity']))
+    assets = assets_from_evelink(char.assets().result)
+    locations.resolve(set(item.location_id for item in iter_assets(assets)), assets)
 
+    location_id = None
+    for item in assets:
+        if item.location_id != location_id:
+            location_id = item.location_id
+            print("Location: ", locationid_to_string(location_id))
+        print("   %-53s %d" % (typeid_to_string(item.type_id), item.quantity))
+        for subitem in item.contents:
+            print("      %-50s %d" % (typeid_to_string(subitem.type_id), subitem.quantity))
 
-def print_charactersheet(char, api):
+
+def character_details(char, api):
     # Character info needs to be fetched from two separate places..
     character_sheet = char.character_sheet().result
     character_info = evelink.eve.EVE(api=api).character_info_from_id(char.char_id).result
+    return character_sheet, character_info
+
+
+def skill_queue_projection(char, character_sheet, now):
+    """Skill queue projected from local skill data, and whether it's paused"""
+    skill_queue = skill_queue_from_evelink(char.skill_queue().result)
+
+    planner = SkillPlanner(skill_data,
+                           attributes_from_evelink(character_sheet),
+                           skills_from_evelink(character_sheet))
+    return planner.project_queue(skill_queue, now), is_paused(skill_queue)
+
+
+def print_charactersheet(char, api):
+    character_sheet, character_info = character_details(char, api)
 
     print("Name: %s [%s] | Age: %s" % (character_sheet['name'],
                                        character_sheet['corp']['name'],
@@ -133,46 +167,118 @@ def print_charactersheet(char, api):
     print("Wallet:", format_currency(balance))
 
     # Skill queue
-    skill_queue = char.skill_queue().result
+    now = time.time()
+    now_dt = datetime.fromtimestamp(now)
+    projection, paused = skill_queue_projection(char, character_sheet, now)
 
-    # Don't print empty or paused skill queue
-    if not skill_queue[0]['end_ts']: return
+    # Nothing training, or everything in the cached queue has finished
+    if not projection:
+        print("Skill queue empty")
+        print("Free room in skill queue!")
+        return
 
-    if len(skill_queue) > 5:
-        print("Skill queue (%d skills total): " % len(skill_queue))
+    if paused:
+        print("Skill queue paused, projected if resumed now:")
+    elif len(projection) > 5:
+        print("Skill queue (%d skills total): " % len(projection))
     else:
         print("Skill queue: ")
     print("%29s %17s %19s" % (format("Skill", '^25'),
                               format("ETA", '^17'),
                               format("Finish", '^19')))
-    queue_length = relativedelta()
-    now = datetime.now()
-
-    for skill in skill_queue[:5]:
-        if skill['end_ts']:
-            end = datetime.fromtimestamp(skill['end_ts'])
-            # skip skills that have already been trained , but are in the cache
-            if end < now: continue
-
-            delta = relativedelta(end, now)
-            queue_length += delta
 
-            eta = timestamp_to_string(skill['end_ts'])
-            finish = datetime.fromtimestamp(skill['end_ts'])
-        else:
+    for skill, start, end in projection[:5]:
+        if end is None:
+            # skill or attributes missing from the local data
             eta = "None"
             finish = "Never"
-            queue_length=relativedelta(hours=+72)
+        else:
+            eta = timestamp_to_string(end, now=now_dt)
+            finish = datetime.fromtimestamp(int(end))
 
-        print("%30s %3s %17s %19s" % (typeid_to_string(skill['type_id']),
-                                      to_roman(skill['level']),
+        print("%30s %3s %17s %19s" % (typeid_to_string(skill.type_id),
+                                      to_roman(skill.level),
                                       eta,
                                       finish))
 
-    if queue_length.days == 0 and queue_length.hours < 24:
+    if paused:
+        print("Skill queue paused, nothing is training!")
+    elif has_free_room(projection, now):
         print("Free room in skill queue!")
 
-def main(apikey):
+
+def export_character(char, api, writer):
+    """Write the same data print_* shows as records"""
+    character_sheet, character_info = character_details(char, api)
+    writer.write('character', dict(char_id=char.char_id,
+                                   name=character_sheet['name'],
+                                   corporation=character_sheet['corp']['name'],
+                                   create_ts=character_sheet['create_ts'],
+                                   location=character_info['location'],
+                                   ship_type=character_info['ship']['type_name'],
+                                   ship_name=character_info['ship']['name'],
+                                   balance=character_sheet['balance'],
+                                   skillpoints=character_sheet['skillpoints']))
+
+    now = time.time()
+    projection, paused = skill_queue_projection(char, character_sheet, now)
+    for skill, start, end in projection:
+        row = skill.as_dict()
+        row.update(char_id=char.char_id, name=typeid_to_string(skill.type_id),
+                   start_ts=start, end_ts=end, paused=paused)
+        writer.write('skill_queue', row)
+
+    for job in active_industry_jobs(char):
+        row = job.as_dict()
+        row.update(char_id=char.char_id, name=typeid_to_string(job.type_id),
+                   activity=activityid_to_string(job.activity_id),
+                   location=locationid_to_string(job.container_id))
+        writer.write('industry_job', row)
+
+    for order in active_market_orders(char):
+        row = order.as_dict()
+        row.update(char_id=char.char_id, name=typeid_to_string(order.type_id), expires_ts=order.expires_ts)
+        writer.write('order', row)
+
+
+def watch_character(char, api, watcher):
+    """Refresh sections the API cache has expired for and emit what changed"""
+    cid = char.char_id
+    now = time.time()
+
+    if watcher.due(cid, 'sheet', now):
+        res = char.character_sheet()
+        sheet = res.result
+        watcher.update(cid, 'sheet', {'sheet': dict(balance=sheet['balance'],
+                                                    skillpoints=sheet['skillpoints'],
+                                                    clone_skillpoints=sheet['clone']['skillpoints'])},
+                       res.expires)
+
+    if watcher.due(cid, 'skill_queue', now):
+        res = char.skill_queue()
+        watcher.update(cid, 'skill_queue',
+                       dict(("%d:%d" % (skill.type_id, skill.level), skill.as_dict())
+                            for skill in skill_queue_from_evelink(res.result)),
+                       res.expires)
+
+    if watcher.due(cid, 'orders', now):
+        res = char.orders()
+        watcher.update(cid, 'orders',
+                       dict((str(order.id), order.as_dict()) for order in orders_from_evelink(res.result)),
+                       res.expires)
+
+    if watcher.due(cid, 'jobs', now):
+        try:
+            res = char.industry_jobs()
+        except evelink.api.APIError, e:
+            print("Api Error:", e, file=sys.stderr)
+        else:
+            watcher.update(cid, 'jobs',
+                           dict((str(job.id), job.as_dict()) for job in industry_jobs_from_evelink(res.result)),
+                           res.expires)
+
+
+def main(apikey, writer=None, watcher=None):
     from evelink.cache.sqlite import SqliteCache
     evelink_cache = SqliteCache('db/evelink_cache.db')
 
@@ -183,13 +289,22 @@ def main(apikey):
 
     try:
         for char_id in a.characters().result:
-            print("-" * 30)
             char = evelink.char.Char(char_id, api)
+            if watcher:
+                watch_character(char, api, watcher)
+                continue
+
+            if writer:
+                export_character(char, api, writer)
+                continue
+
+            print("-" * 30)
             print_charactersheet(char, api)
             print_industry_jobs(char, api)
             print_orders(char, api)
     except evelink.api.APIError, e:
-        print("Api Error:", e)
+        # keep machine readable output clean
+        print("Api Error:", e, file=sys.stderr if writer or watcher else sys.stdout)
 
 
 
@@ -200,12 +315,52 @@ if __name__ == "__main__":
 
         sys.exit(1)
 
+    import argparse
+    import export
+
+    parser = argparse.ArgumentParser(description="Display status of all characters")
+    export.add_arguments(parser)
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running and only print changes since the last check")
+    parser.add_argument('--interval', type=int, default=300,
+                        help="seconds between checks in watch mode (default: %(default)s)")
+    parser.add_argument('--hook',
+                        help="command to pipe changes to in watch mode instead of stdout")
+    args = parser.parse_args()
+    if args.watch and args.format != 'text':
+        parser.error("--format can't be used with --watch, changes are always JSON lines")
+    writer = export.get_writer(args.format, output_dir=args.output)
+
     import yaml
     config = yaml.load(file('config.yml'))
 
     # Just one account specified
     if 'key' in config and 'verification' in config:
-        main((config['key'], config['verification']))
+        apikeys = [(config['key'], config['verification'])]
     else:
-        for account in config.keys():
-            main((config[account]['key'], config[account]['verification']))
+        apikeys = [(config[account]['key'], config[account]['verification'])
+                   for account in config.keys() if account not in ('maintenance', 'watch')]
+
+    if args.watch:
+        import watch
+        watcher = watch.Watcher(hook=args.hook or config.get('watch', {}).get('hook'))
+        try:
+            while True:
+                for apikey in apikeys:
+                    main(apikey, watcher=watcher)
+                watcher.save()
+                maintenance.run_if_needed(config.get('maintenance'))
+                time.sleep(args.interval)
+        except KeyboardInterrupt:
+            # deltas already emitted this cycle must not be repeated
+            watcher.save()
+            sys.exit(0)
+
+    for apikey in apikeys:
+        main(apikey, writer)
+
+    if writer:
+        writer.close()
+
+    # prune and compact the cache databases if they've grown over budget
+    maintenance.run_if_needed(config.get('maintenance'))
@@ -0,0 +1,104 @@
+from __future__ import unicode_literals, division, absolute_import, print_function
+
+import sqlite3
+import unittest
+
+from locations import LocationResolver, location_kind, office_station_id
+from models import assets_from_evelink
+
+JITA = 30000142
+PERIMETER = 30000144
+THE_FORGE = 10000002
+JITA_4_4 = 60003760
+JITA_IV = 40009077
+
+
+def static_db():
+    conn = sqlite3.connect(':memory:')
+    conn.executescript("""
+        create table staStations (stationID, stationName, solarSystemID);
+        create table mapSolarSystems (solarSystemID, solarSystemName, regionID);
+        create table mapRegions (regionID, regionName);
+        create table mapDenormalize (itemID, itemName, solarSystemID, regionID);
+        create table invTypes (typeID, typeName);
+        insert into staStations values (60003760, 'Jita IV - Moon 4', 30000142);
+        insert into mapSolarSystems values (30000142, 'Jita', 10000002), (30000144, 'Perimeter', 10000002);
+        insert into mapRegions values (10000002, 'The Forge');
+        insert into mapDenormalize values (40009077, 'Jita IV', 30000142, 10000002);
+        insert into invTypes values (3465, 'Large Secure Container'), (3467, 'Small Secure Container');
+    """)
+    return conn
+
+
+class OfficeTest(unittest.TestCase):
+    def test_office_station_id(self):
+        self.assertEqual(office_station_id(66003761), JITA_4_4)
+        self.assertEqual(office_station_id(66014933), 60014932)
+        # outposts use a different offset
+        self.assertEqual(office_station_id(66014944), 60014944)
+
+    def test_location_kind(self):
+        self.assertEqual(location_kind(THE_FORGE), 'region')
+        self.assertEqual(location_kind(JITA), 'system')
+        self.assertEqual(location_kind(JITA_4_4), 'station')
+        self.assertEqual(location_kind(66003761), 'office')
+        self.assertEqual(location_kind(1020000000000), 'structure')
+        self.assertEqual(location_kind(JITA_IV), 'unknown')
+
+
+class LocationResolverTest(unittest.TestCase):
+    def setUp(self):
+        self.resolver = LocationResolver(static_db())
+        # a container inside a container in Jita 4-4
+        self.assets = assets_from_evelink({
+            JITA_4_4: {'location_id': JITA_4_4, 'contents': [
+                {'id': 1000000001, 'item_type_id': 3465, 'quantity': 1, 'location_id': JITA_4_4, 'contents': [
+                    {'id': 1000000002, 'item_type_id': 3467, 'quantity': 1},
+                ]},
+            ]},
+        })
+
+    def test_hierarchy(self):
+        ids = [JITA_4_4, PERIMETER, JITA_IV, 66003761, 1000000002]
+        self.resolver.resolve(ids, self.assets)
+
+        station = self.resolver.get(JITA_4_4)
+        self.assertEqual((station.kind, station.system.name, station.region.name), ('station', 'Jita', 'The Forge'))
+
+        system = self.resolver.get(PERIMETER)
+        self.assertEqual((system.kind, system.region.name), ('system', 'The Forge'))
+
+        planet = self.resolver.get(JITA_IV)
+        self.assertEqual((planet.kind, planet.system.id), ('celestial', JITA))
+
+        office = self.resolver.get(66003761)
+        self.assertEqual((office.kind, office.station.id), ('office', JITA_4_4))
+
+        container = self.resolver.get(1000000002)
+        self.assertEqual(container.kind, 'container')
+        self.assertEqual(container.parent.id, 1000000001)
+        self.assertEqual(container.station.id, JITA_4_4)
+        self.assertEqual(container.region.id, THE_FORGE)
+
+    def test_names(self):
+        self.resolver.resolve([1000000002], self.assets)
+        self.assertEqual(self.resolver.name(1000000002),
+                         "Small Secure Container in Large Secure Container in Jita IV - Moon 4")
+        self.assertEqual(self.resolver.name(66003761), "Office in Jita IV - Moon 4")
+
+    def test_unknown_ids(self):
+        self.assertEqual(self.resolver.name(1020000000000), "Structure(1020000000000)")
+        self.assertEqual(self.resolver.name(60014944), "Station(60014944)")
+        self.assertEqual(self.resolver.name(123), "Unknown(123)")
+
+    def test_cached(self):
+        self.resolver.resolve([JITA_4_4])
+        station = self.resolver.get(JITA_4_4)
+        self.resolver.conn.close()
+        # no more queries once resolved
+        self.assertIs(self.resolver.get(JITA_4_4), station)
+        self.assertEqual(self.resolver.name(JITA), 'Jita')
+
+
+if __name__ == '__main__':
+    unittest.main()
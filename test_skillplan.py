@@ -0,0 +1,87 @@
+from __future__ import unicode_literals, division, absolute_import, print_function
+
+import sqlite3
+import unittest
+
+from models import SkillQueueEntry
+from skillplan import SkillData, SkillPlanner, has_free_room, is_paused
+
+# rank 1 perception/willpower skill and a rank 3 one
+SPACESHIP_COMMAND = 3327
+GUNNERY = 3300
+
+
+def skill_data():
+    conn = sqlite3.connect(':memory:')
+    conn.executescript("""
+        create table dgmTypeAttributes (typeID, attributeID, valueInt, valueFloat);
+        insert into dgmTypeAttributes values (3300, 275, NULL, 1.0), (3300, 180, 167, NULL), (3300, 181, 168, NULL);
+        insert into dgmTypeAttributes values (3327, 275, NULL, 3.0), (3327, 180, 167, NULL), (3327, 181, 168, NULL);
+    """)
+    return SkillData(conn)
+
+
+def queue_entry(type_id, level, start_sp, end_sp, start_ts=None, end_ts=None, position=0):
+    return SkillQueueEntry(position=position, type_id=type_id, level=level, start_sp=start_sp, end_sp=end_sp,
+                           start_ts=start_ts, end_ts=end_ts)
+
+
+class SkillPlannerTest(unittest.TestCase):
+    def setUp(self):
+        # 20 + 20 / 2 = 30 skill points per minute
+        self.planner = SkillPlanner(skill_data(), {'perception': 20, 'willpower': 20}, {GUNNERY: 1415})
+
+    def test_training_time(self):
+        self.assertEqual(self.planner.training_time(GUNNERY, 3), 13170)
+        self.assertEqual(self.planner.training_time(GUNNERY, 2), 0)
+        self.assertEqual(self.planner.training_time(SPACESHIP_COMMAND, 1), 1500)
+
+    def test_training_time_unknown(self):
+        self.assertIsNone(self.planner.training_time(1, 1))
+        planner = SkillPlanner(skill_data(), {})
+        self.assertIsNone(planner.training_time(GUNNERY, 1))
+
+    def test_plan_time(self):
+        # levels trained earlier in the plan count towards later ones
+        self.assertEqual(self.planner.plan_time([(GUNNERY, 3), (GUNNERY, 4)]), 13170 + 74510)
+        self.assertEqual(self.planner.plan_time([(GUNNERY, 2), (SPACESHIP_COMMAND, 1)]), 1500)
+        self.assertIsNone(self.planner.plan_time([(GUNNERY, 3), (1, 1)]))
+
+    def test_project_active_queue(self):
+        now = 1000.5
+        queue = [queue_entry(GUNNERY, 2, 250, 1415, start_ts=0, end_ts=500),
+                 queue_entry(GUNNERY, 3, 1415, 8000, start_ts=500, end_ts=13670, position=1)]
+        projection = self.planner.project_queue(queue, now)
+
+        # finished entries are dropped, api times are kept
+        self.assertEqual([(entry.level, begin, end) for entry, begin, end in projection], [(3, 1000, 13670)])
+        self.assertFalse(is_paused(queue))
+        self.assertTrue(has_free_room(projection, now))
+
+    def test_project_paused_queue(self):
+        now = 1000.5
+        queue = [queue_entry(GUNNERY, 3, 1415, 8000),
+                 queue_entry(SPACESHIP_COMMAND, 1, 0, 750, position=1)]
+        projection = self.planner.project_queue(queue, now)
+
+        self.assertEqual([(begin, end) for entry, begin, end in projection],
+                         [(1000, 14170), (14170, 15670)])
+        for entry, begin, end in projection:
+            self.assertIsInstance(begin, int)
+            self.assertIsInstance(end, int)
+        self.assertTrue(is_paused(queue))
+
+    def test_project_untimeable_entry(self):
+        queue = [queue_entry(1, 1, 0, 250),
+                 queue_entry(GUNNERY, 3, 1415, 8000, position=1)]
+        projection = self.planner.project_queue(queue, 0)
+
+        self.assertEqual([end for entry, begin, end in projection], [None, None])
+        self.assertFalse(has_free_room(projection, 0))
+
+    def test_empty_queue_has_free_room(self):
+        self.assertTrue(has_free_room([], 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
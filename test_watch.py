@@ -0,0 +1,92 @@
+from __future__ import unicode_literals, division, absolute_import, print_function
+
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from watch import Watcher, diff, section_hash
+
+
+class DiffTest(unittest.TestCase):
+    def test_added_changed_removed(self):
+        old = {'1': {'amount_left': 5, 'status': 'active'},
+               '2': {'amount_left': 1, 'status': 'active'},
+               '3': {'amount_left': 9, 'status': 'active'}}
+        new = {'1': {'amount_left': 2, 'status': 'active'},
+               '3': {'amount_left': 9, 'status': 'active'},
+               '4': {'amount_left': 7, 'status': 'active'}}
+        changes = sorted(diff(old, new), key=lambda change: change['key'])
+
+        self.assertEqual(changes, [
+            dict(change='changed', key='1', fields=['amount_left'], old=old['1'], new=new['1']),
+            dict(change='removed', key='2', old=old['2']),
+            dict(change='added', key='4', new=new['4']),
+        ])
+
+    def test_changed_fields(self):
+        changes = diff({'1': {'a': 1, 'b': 2}}, {'1': {'a': 1, 'c': 3}})
+        self.assertEqual(changes[0]['fields'], ['b', 'c'])
+
+    def test_unchanged(self):
+        records = {'1': {'a': 1}}
+        self.assertEqual(diff(records, dict(records)), [])
+
+    def test_hash_ignores_key_order(self):
+        self.assertEqual(section_hash({'a': 1, 'b': 2}), section_hash({'b': 2, 'a': 1}))
+
+
+class RecordingWatcher(Watcher):
+    def emit(self, deltas):
+        self.emitted.extend(deltas)
+
+
+class WatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'state.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def watcher(self):
+        watcher = RecordingWatcher(self.path)
+        watcher.emitted = []
+        return watcher
+
+    def test_first_snapshot_is_silent(self):
+        watcher = self.watcher()
+        self.assertEqual(watcher.update(1, 'orders', {'1': {'amount_left': 5}}, 100), [])
+        self.assertTrue(watcher.due(1, 'orders', 100))
+        self.assertFalse(watcher.due(1, 'orders', 99))
+
+    def test_deltas_across_runs(self):
+        watcher = self.watcher()
+        watcher.update(1, 'orders', {'1': {'amount_left': 5}}, 100)
+        watcher.save()
+
+        watcher = self.watcher()
+        deltas = watcher.update(1, 'orders', {'1': {'amount_left': 3}}, 200)
+        self.assertEqual(len(deltas), 1)
+        self.assertEqual((deltas[0]['char_id'], deltas[0]['section'], deltas[0]['change'], deltas[0]['key']),
+                         (1, 'orders', 'changed', '1'))
+        self.assertEqual(watcher.emitted, deltas)
+
+    def test_save_only_when_dirty(self):
+        watcher = self.watcher()
+        watcher.update(1, 'orders', {'1': {'amount_left': 5}}, 100)
+        watcher.save()
+        os.utime(self.path, (0, 0))
+
+        # same records and expiry, nothing to write
+        watcher.update(1, 'orders', {'1': {'amount_left': 5}}, 100)
+        watcher.save()
+        self.assertEqual(os.path.getmtime(self.path), 0)
+
+        watcher.update(1, 'orders', {'1': {'amount_left': 5}}, 200)
+        watcher.save()
+        self.assertNotEqual(os.path.getmtime(self.path), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
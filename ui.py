@@ -13,11 +13,15 @@ import evelink
 import requests
 import dataset
 from datetime import datetime
+import time
 import sqlite3
 import os.path
 import sys
 
 from util import *
+from models import *
+from locations import LocationResolver
+from skillplan import SkillData, SkillPlanner
 
 DB_DIR = 'db'
 
@@ -38,6 +42,8 @@ if not os.path.exists(EVE_DB_PATH):
 
 conn = sqlite3.connect(EVE_DB_PATH) # Eve online static db
 db = dataset.connect("sqlite:///%s/evetools.db" % DB_DIR) # evetools cache db
+locations = LocationResolver(conn) # cached location hierarchy
+skill_data = SkillData(conn) # skill ranks and attributes
 
 
 def dbquery(sql, uid):
@@ -46,7 +52,7 @@ def dbquery(sql, uid):
     c.execute(sql % uid)
     res = c.fetchone()
     c.close()
-    return res[0]
+    return intern_string(res[0])
 
 
 def activityid_to_string(uid):
@@ -54,7 +60,7 @@ def activityid_to_string(uid):
 
 
 def locationid_to_string(uid):
-    return dbquery("select stationName from staStations where stationID = %d;", uid)
+    return locations.name(uid)
 
 
 def typeid_to_string(uid):
@@ -68,71 +74,55 @@ class CharacterFactory(object):
         character_sheet = char.character_sheet().result
         character_info = evelink.eve.EVE(api=api).character_info_from_id(char.char_id).result
 
-        c = Character()
-        c.cid = char_id
-        c.name = character_sheet['name']
-        c.corporation = character_sheet['corp']['name']
-        c.age = character_sheet['create_ts']
-        c.location = character_info['location']
-        c.balance = int(character_sheet['balance'])
-        c.skillpoints = character_sheet['skillpoints']
-        c.clone_skillpoints = character_sheet['clone']['skillpoints']
-        c.skill_queue = char.skill_queue().result
-        c.active_jobs = [v for v in char.industry_jobs().result.values() if v['delivered'] == False]
-        c.active_orders = [order for order in char.orders().result.values() if order['status'] == 'active']
+        c = Character.from_evelink(char_id, character_sheet, character_info)
+        c.skill_queue = skill_queue_from_evelink(char.skill_queue().result)
+        c.active_jobs = [job for job in industry_jobs_from_evelink(char.industry_jobs().result) if job.delivered == False]
+        c.active_orders = [order for order in orders_from_evelink(char.orders().result) if order.status == 'active']
 
         return c
 
-class Character(object):
-    cid = None
-    name = None
-    corporation = None
-    age = None
-    location = None
-    balance = None
-    skillpoints = None
-    clone_skillpoints = None
-    active_jobs = None
-    active_orders = None
-    skill_queue = None
 
-    def get_balance_formatted(self):
-        return format_currency(self.balance)
+def skill_queue_items(character):
+    items = []
+    now = time.time()
+    now_dt = datetime.fromtimestamp(now)
+    planner = SkillPlanner(skill_data, character.attributes, character.skills)
+    # skill name skill level, time to end, end time
+    for skill, start, end in planner.project_queue(character.skill_queue, now):
+        if end is None:
+            items.append(["%s %s" % (typeid_to_string(skill.type_id), to_roman(skill.level)), "None", "Never"])
+            continue
+        items.append(["%s %s" % (typeid_to_string(skill.type_id), to_roman(skill.level)),
+                            timestamp_to_string(end, now=now_dt),
+                            datetime.fromtimestamp(int(end))])
 
+    return items
 
-    def get_skill_queue_items(self):
-        items = []
-        # skill name skill level, time to end, end time
-        for skill in self.skill_queue:
-            items.append(["%s %s" % (typeid_to_string(skill['type_id']), to_roman(skill['level'])),
-                                timestamp_to_string(skill['end_ts']),
-                                datetime.fromtimestamp(skill['end_ts'])])
 
-        return items
+def active_jobs_items(character):
+    items = []
 
-    def get_active_jobs_items(self):
-        items = []
+    for job in character.active_jobs:
+        items.append([activityid_to_string(job.activity_id),
+                     typeid_to_string(job.type_id),
+                     timestamp_to_string(job.end_ts)])
 
-        for job in self.active_jobs:
-            items.append([activityid_to_string(job['activity_id']),
-                         typeid_to_string(job['output']['type_id']),
-                         timestamp_to_string(job['end_ts'])])
+    return items
 
-        return items
 
-    def get_active_orders(self):
-        items = []
-        total_isk = 0
+def active_orders_items(character):
+    items = []
+    total_isk = 0
 
-        for order in self.active_orders:
-            total_isk += order['price'] * order['amount_left']
-            items.append([typeid_to_string(order['type_id']),
-                          format_currency(order['price']),
-                           order['amount_left']])
+    for order in character.active_orders:
+        total_isk += order.total
+        items.append([typeid_to_string(order.type_id),
+                      format_currency(order.price),
+                       order.amount_left])
 
-        items.append(["TOTAL:", format_currency(total_isk), ""])
+    items.append(["TOTAL:", format_currency(total_isk), ""])
 
-        return items
+    return items
 
 
 class CharacterSummary(npyscreen.ActionForm):
@@ -202,7 +192,7 @@ class CharacterSummary(npyscreen.ActionForm):
         fields['name_corp'].value = "%s [%s]" % (character.name, character.corporation)
         fields['age'].value = timestamp_to_string(character.age, True)
         fields['location'].value = character.location
-        fields['balance'].value = character.get_balance_formatted()
+        fields['balance'].value = format_currency(character.balance)
         fields['skillpoints'].value = character.skillpoints
         fields['clone_skillpoints'].value = character.clone_skillpoints
 
@@ -210,14 +200,14 @@ class CharacterSummary(npyscreen.ActionForm):
 
         #npyscreen.notify_wait(fields.keys())
 
-        items = character.get_skill_queue_items()
+        items = skill_queue_items(character)
         try:
             fields['skill_queue'].height=len(items)+5
             fields['skill_queue'].value = items
         except:
             pass
 
-        items = character.get_active_jobs_items()
+        items = active_jobs_items(character)
         try:
             fields['active_jobs'].height=len(items)+3
             fields['active_jobs'].value = items
@@ -243,7 +233,7 @@ class CharacterSummary(npyscreen.ActionForm):
 
 
     def update_skill_queue(self, character):
-        items = character.get_skill_queue_items()
+        items = skill_queue_items(character)
         self.character_fields[character.cid]['skill_queue'].height = len(items)+3
         self.character_fields[character.cid]['skill_queue'].values = items
 
@@ -251,20 +241,20 @@ class CharacterSummary(npyscreen.ActionForm):
     def display_skill_queue(self, character):
         titles = ['Skill', 'ETA', 'Finish']
         #npyscreen.notify_wait("Before %s" % self.character_fields[character.cid].keys())
-        items = character.get_skill_queue_items()
+        items = skill_queue_items(character)
         self.character_fields[character.cid]['skill_queue'] = self._display_grid(titles, items)
         #npyscreen.notify_wait("After %s" % self.character_fields[character.cid].keys())
         #self.update_skill_queue(character)
 
 
     def display_industry_jobs(self, character):
-        items = character.get_active_jobs_items()
+        items = active_jobs_items(character)
         if not items: return
         titles = ['Type', 'Item', 'ETA']
         self.character_fields[character.cid]['active_jobs'] = self._display_grid(titles, items)
 
     def display_orders(self, character):
-        items = character.get_active_orders()
+        items = active_orders_items(character)
         if len(items) < 2: return  # orders always has the TOTAL row
         titles = ['Item', 'à ISK', 'Amount']
         self._display_grid(titles, items)
@@ -353,8 +343,8 @@ def class_test():
         print "Creating character", char_id
         c = CharacterFactory.create_character(api, char_id)
         print c.name
-        print c.get_skill_queue_items()
-        print c.get_active_jobs_items()
+        print skill_queue_items(c)
+        print active_jobs_items(c)
 
 
 if __name__ == '__main__':
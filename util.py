@@ -15,9 +15,10 @@ def to_roman(n):
     return ['I', 'II', 'III', 'IV', 'V'][n - 1]
 
 
-def timestamp_to_string(timestamp, reverse=False):
+def timestamp_to_string(timestamp, reverse=False, now=None):
     completion = datetime.fromtimestamp(timestamp)
-    now = datetime.now()
+    if now is None:
+        now = datetime.now()
     if reverse:
         age = now - completion
     else:
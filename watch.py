@@ -0,0 +1,108 @@
+"""Emit only what changed between runs
+
+The last snapshot of each character section (sheet, skill queue, orders,
+jobs) is kept in a state file together with a hash of its records and the
+time the API says the data is cached until. Sections that are still cached
+are not fetched at all and sections whose hash didn't change are not
+diffed, so a cycle only does real work for data that actually changed.
+
+Deltas are JSON objects, one per line:
+
+    {"char_id": 123, "section": "orders", "change": "changed", "key": "456",
+     "fields": ["amount_left"], "old": {...}, "new": {...}, "ts": 1400000000}
+
+They are written to stdout, or to the stdin of a hook command.
+"""
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+
+import hashlib
+import json
+import os.path
+import subprocess
+import sys
+import time
+
+STATE_PATH = os.path.join('db', 'watch_state.json')
+
+
+def section_hash(records):
+    return hashlib.sha1(json.dumps(records, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def diff(old, new):
+    """Added, removed and changed records between two {key: record} dicts"""
+    changes = []
+    for key, record in new.items():
+        previous = old.get(key)
+        if previous is None:
+            changes.append(dict(change='added', key=key, new=record))
+        elif previous != record:
+            fields = sorted(field for field in set(previous) | set(record)
+                            if previous.get(field) != record.get(field))
+            changes.append(dict(change='changed', key=key, fields=fields, old=previous, new=record))
+    for key, record in old.items():
+        if key not in new:
+            changes.append(dict(change='removed', key=key, old=record))
+    return changes
+
+
+class Watcher(object):
+    def __init__(self, path=STATE_PATH, hook=None):
+        self.path = path
+        self.hook = hook
+        self.state = {}
+        self.dirty = False
+        if os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def _section(self, char_id, section):
+        return self.state.get(str(char_id), {}).get(section)
+
+    def due(self, char_id, section, now):
+        """Whether the API might have anything new for this section"""
+        stored = self._section(char_id, section)
+        return stored is None or now >= stored['expires']
+
+    def update(self, char_id, section, records, expires):
+        """Store a new snapshot of a section, returns the deltas
+
+        records is a dict of JSON serializable records keyed by a string
+        """
+        now = int(time.time())
+        digest = section_hash(records)
+        stored = self._section(char_id, section)
+
+        deltas = []
+        if stored is not None and stored['hash'] != digest:
+            for delta in diff(stored['records'], records):
+                delta.update(char_id=char_id, section=section, ts=now)
+                deltas.append(delta)
+
+        if stored is None or stored['hash'] != digest or stored['expires'] != expires:
+            self.state.setdefault(str(char_id), {})[section] = dict(hash=digest, expires=expires, records=records)
+            self.dirty = True
+        self.emit(deltas)
+        return deltas
+
+    def emit(self, deltas):
+        if not deltas:
+            return
+        lines = "".join(json.dumps(delta, sort_keys=True) + "\n" for delta in deltas)
+        if self.hook:
+            process = subprocess.Popen(self.hook, shell=True, stdin=subprocess.PIPE)
+            process.communicate(lines.encode('utf-8'))
+        else:
+            sys.stdout.write(lines)
+            sys.stdout.flush()
+
+    def save(self):
+        """Write the state file, only if a section changed since the last save"""
+        if not self.dirty:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.rename(tmp_path, self.path)
+        self.dirty = False